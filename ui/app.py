@@ -1,6 +1,12 @@
 import streamlit as st
 import pandas as pd
+import pyarrow as pa
+from pyarrow import csv as pacsv
+import json
+from io import BytesIO
 from pathlib import Path
+import matplotlib
+matplotlib.use("Agg")
 import matplotlib.pyplot as plt
 from pandas.tseries.offsets import MonthEnd
 
@@ -20,41 +26,66 @@ st.caption("Advisory demand forecasts to support production & material planning"
 BASE_DIR = Path(__file__).resolve().parent.parent
 OUTPUT_DIR = BASE_DIR / "outputs"
 
+OUTPUT_FILES = (
+    "forecast_summary.parquet",
+    "monthly_history.parquet",
+    "dropdown_options.json",
+    "customer_names.csv",
+    "item_names.csv",
+)
 
-# Load Persisted Outputs
 
-forecast_summary = pd.read_csv(OUTPUT_DIR / "forecast_summary.csv")
-monthly_history = pd.read_csv(OUTPUT_DIR / "monthly_history.csv")
-customer_item_map = pd.read_csv(OUTPUT_DIR / "customer_item_map.csv")
+# Load Persisted Outputs (cached per output file mtimes, so a new batch run
+# is picked up on the next rerun; only the latest batch is kept in memory)
 
-customer_names = pd.read_csv(OUTPUT_DIR / "customer_names.csv")
-item_names = pd.read_csv(OUTPUT_DIR / "item_names.csv")
+@st.cache_data(max_entries=1)
+def load_outputs(output_mtimes):
+    forecast_summary = pd.read_parquet(OUTPUT_DIR / "forecast_summary.parquet")
+    monthly_history = (
+        pd.read_parquet(OUTPUT_DIR / "monthly_history.parquet")
+        .set_index(["CustId", "ItemCode"])
+        .sort_index()
+    )
+    with open(OUTPUT_DIR / "dropdown_options.json", encoding="utf-8") as f:
+        dropdown_options = json.load(f)
 
-# Ensure correct dtypes
-customer_names["CustId"] = customer_names["CustId"].astype(int)
-customer_names["CustName"] = customer_names["CustName"].astype(str)
+    customer_names = pd.read_csv(OUTPUT_DIR / "customer_names.csv")
+    item_names = pd.read_csv(OUTPUT_DIR / "item_names.csv")
 
-item_names["ItemCode"] = item_names["ItemCode"].astype(str)
-item_names["ItemName"] = item_names["ItemName"].astype(str)
+    # Ensure correct dtypes
+    customer_names["CustId"] = customer_names["CustId"].astype(int)
+    customer_names["CustName"] = customer_names["CustName"].astype(str)
 
-# Create lookup dictionaries
-cust_id_to_name = dict(
-    zip(customer_names["CustId"], customer_names["CustName"])
-)
+    item_names["ItemCode"] = item_names["ItemCode"].astype(str)
+    item_names["ItemName"] = item_names["ItemName"].astype(str)
 
-item_code_to_name = dict(
-    zip(item_names["ItemCode"], item_names["ItemName"])
-)
+    # Create lookup dictionaries
+    cust_id_to_name = dict(
+        zip(customer_names["CustId"], customer_names["CustName"])
+    )
 
-# Ensure correct dtypes
-forecast_summary["CustId"] = forecast_summary["CustId"].astype(int)
-forecast_summary["ItemCode"] = forecast_summary["ItemCode"].astype(str)
+    item_code_to_name = dict(
+        zip(item_names["ItemCode"], item_names["ItemName"])
+    )
 
-monthly_history["CustId"] = monthly_history["CustId"].astype(int)
-monthly_history["ItemCode"] = monthly_history["ItemCode"].astype(str)
+    return (
+        forecast_summary,
+        monthly_history,
+        dropdown_options,
+        cust_id_to_name,
+        item_code_to_name,
+    )
 
-customer_item_map["CustId"] = customer_item_map["CustId"].astype(int)
-customer_item_map["ItemCode"] = customer_item_map["ItemCode"].astype(str)
+
+(
+    forecast_summary,
+    monthly_history,
+    dropdown_options,
+    cust_id_to_name,
+    item_code_to_name,
+) = load_outputs(
+    tuple((OUTPUT_DIR / name).stat().st_mtime_ns for name in OUTPUT_FILES)
+)
 
 
 # Filters — Main Page (UI-2)
@@ -64,7 +95,7 @@ st.subheader("🔎 Filters")
 col1, col2 = st.columns(2)
 
 with col1:
-    customer_list = sorted(customer_item_map["CustId"].unique())
+    customer_list = dropdown_options["customers"]
     # selected_customer = st.selectbox("Select Customer", customer_list)
     selected_customer = st.selectbox(
     "Select Customer",
@@ -75,11 +106,7 @@ with col1:
 
 
 with col2:
-    items_for_customer = (
-        customer_item_map
-        .loc[customer_item_map["CustId"] == selected_customer, "ItemCode"]
-        .sort_values()
-    )
+    items_for_customer = dropdown_options["items_by_customer"][str(selected_customer)]
     # selected_item = st.selectbox("Select Item", items_for_customer)
     selected_item = st.selectbox(
     "Select Item",
@@ -134,7 +161,7 @@ else:
     else:
         st.metric(
             "📦 Forecast Quantity (Next Month)",
-            f"{int(row['ForecastQty_NextMonth']):,}"
+            f"{row['ForecastQty_NextMonth']:,}"
         )
 
 
@@ -143,19 +170,21 @@ else:
 st.markdown("---")
 st.subheader("📈 Monthly Demand History")
 
-selected_history = (
-    monthly_history[
-        (monthly_history["CustId"] == selected_customer) &
-        (monthly_history["ItemCode"] == selected_item)
-    ]
-    .sort_values("YearMonth")
-)
+try:
+    selected_history = (
+        monthly_history
+        .loc[[(selected_customer, selected_item)]]
+        .reset_index()
+        .sort_values("YearMonth")
+    )
+except KeyError:
+    selected_history = monthly_history.iloc[:0].reset_index()
 
 if selected_history.empty:
     st.info("No historical demand found for this Customer × Item.")
 else:
     plot_df = selected_history.copy()
-    plot_df["YearMonth"] = pd.to_datetime(plot_df["YearMonth"].astype(str))
+    plot_df["YearMonth"] = plot_df["YearMonth"].dt.to_timestamp()
 
     last_month = plot_df["YearMonth"].max()
     forecast_value = (
@@ -191,6 +220,7 @@ else:
     ax.grid(True)
 
     st.pyplot(fig)
+    plt.close(fig)
 
 
 # Monthly History Table (UI-7)
@@ -208,10 +238,15 @@ st.markdown("---")
 st.subheader("⬇️ Export")
 
 export_df = selected_history.copy()
+# pyarrow's CSV writer has no period type; write YearMonth as text
+export_df["YearMonth"] = export_df["YearMonth"].astype(str)
+
+export_buf = BytesIO()
+pacsv.write_csv(pa.Table.from_pandas(export_df, preserve_index=False), export_buf)
 
 st.download_button(
     label="Download Monthly History (CSV)",
-    data=export_df.to_csv(index=False),
+    data=export_buf.getvalue(),
     file_name=f"monthly_history_{selected_customer}_{selected_item}.csv",
     mime="text/csv"
 )
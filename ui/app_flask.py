@@ -1,6 +1,14 @@
 from flask import Flask, render_template, request, send_file
 import pandas as pd
+import pyarrow as pa
+from pyarrow import csv as pacsv
+import json
+from io import BytesIO
+from functools import lru_cache
 from pathlib import Path
+from threading import Lock
+import matplotlib
+matplotlib.use("Agg")  # headless rendering, no GUI toolkit under Flask
 import matplotlib.pyplot as plt
 from pandas.tseries.offsets import MonthEnd
 
@@ -8,27 +16,22 @@ app = Flask(__name__)
 
 # PATHS (matches your project)
 
-app = Flask(__name__)
-
-# BASE_DIR = Path(__file__).resolve().parent.parent
-# OUTPUT_DIR = BASE_DIR / "outputs"
-# STATIC_DIR = Path(__file__).resolve().parent / "static" / "charts"
-
 BASE_DIR = Path(__file__).resolve().parent
 OUTPUT_DIR = BASE_DIR.parent / "outputs"
 STATIC_DIR = BASE_DIR / "static" / "charts"
-
-# BASE_DIR = Path(__file__).resolve().parent.parent
-# OUTPUT_DIR = BASE_DIR / "outputs"
-# STATIC_DIR = Path(__file__).resolve().parent / "static" / "charts"
-# STATIC_DIR.mkdir(parents=True, exist_ok=True)
+STATIC_DIR.mkdir(parents=True, exist_ok=True)
 
 
 # LOAD DATA (same as Streamlit)
 
-forecast_summary = pd.read_csv(OUTPUT_DIR / "forecast_summary.csv")
-monthly_history = pd.read_csv(OUTPUT_DIR / "monthly_history.csv")
-customer_item_map = pd.read_csv(OUTPUT_DIR / "customer_item_map.csv")
+forecast_summary = pd.read_parquet(OUTPUT_DIR / "forecast_summary.parquet")
+monthly_history = (
+    pd.read_parquet(OUTPUT_DIR / "monthly_history.parquet")
+    .set_index(["CustId", "ItemCode"])
+    .sort_index()
+)
+with open(OUTPUT_DIR / "dropdown_options.json", encoding="utf-8") as f:
+    dropdown_options = json.load(f)
 customer_names = pd.read_csv(OUTPUT_DIR / "customer_names.csv")
 item_names = pd.read_csv(OUTPUT_DIR / "item_names.csv")
 
@@ -36,37 +39,78 @@ cust_id_to_name = dict(zip(customer_names.CustId, customer_names.CustName))
 item_code_to_name = dict(zip(item_names.ItemCode, item_names.ItemName))
 
 
+def get_history(cust, item):
+    # Indexed lookup on (CustId, ItemCode) instead of scanning every row
+    try:
+        return (
+            monthly_history
+            .loc[[(cust, item)]]
+            .reset_index()
+            .sort_values("YearMonth")
+        )
+    except KeyError:
+        return monthly_history.iloc[:0].reset_index()
+
+
+def get_summary(cust, item):
+    return forecast_summary[
+        (forecast_summary.CustId == cust) &
+        (forecast_summary.ItemCode == item)
+    ]
+
+
+def get_chart(cust, item):
+    # Forecast charts are pre-rendered by the pipeline; render only on a miss.
+    # Checked on every request (not cached) because a pipeline run replaces
+    # the chart files underneath the running app.
+    if (STATIC_DIR / f"{cust}_{item}.png").exists():
+        return f"charts/{cust}_{item}.png"
+
+    return generate_chart(
+        get_history(cust, item), get_summary(cust, item), cust, item
+    )
+
+
+# PER-PAIR CACHES (outputs are static for the life of the process)
+
+@lru_cache(maxsize=1024)
+def get_history_csv(cust, item):
+    history = get_history(cust, item)
+    # pyarrow's CSV writer has no period type; write YearMonth as text
+    history["YearMonth"] = history["YearMonth"].astype(str)
+
+    buf = BytesIO()
+    pacsv.write_csv(pa.Table.from_pandas(history, preserve_index=False), buf)
+    return buf.getvalue()
+
+
 # MAIN PAGE (replaces Streamlit rerun)
 
 @app.route("/", methods=["GET"])
 def dashboard():
-    customers = sorted(customer_item_map["CustId"].unique())
+    customers = dropdown_options["customers"]
 
     selected_customer = request.args.get("customer", type=int)
     selected_item = request.args.get("item")
 
     items = []
     summary = None
+    forecast_qty = None
     history = None
     chart_file = None
 
     if selected_customer:
-        items = customer_item_map.loc[
-            customer_item_map["CustId"] == selected_customer, "ItemCode"
-        ].tolist()
+        items = dropdown_options["items_by_customer"].get(str(selected_customer), [])
 
     if selected_customer and selected_item:
-        summary = forecast_summary[
-            (forecast_summary.CustId == selected_customer) &
-            (forecast_summary.ItemCode == selected_item)
-        ]
+        summary = get_summary(selected_customer, selected_item)
+
+        if not summary.empty and pd.notna(summary.iloc[0]["ForecastQty_NextMonth"]):
+            forecast_qty = int(summary.iloc[0]["ForecastQty_NextMonth"])
 
-        history = monthly_history[
-            (monthly_history.CustId == selected_customer) &
-            (monthly_history.ItemCode == selected_item)
-        ].sort_values("YearMonth")
+        history = get_history(selected_customer, selected_item)
 
-        chart_file = generate_chart(history, summary, selected_customer, selected_item)
+        chart_file = get_chart(selected_customer, selected_item)
 
     return render_template(
         "dashboard.html",
@@ -75,6 +119,7 @@ def dashboard():
         selected_customer=selected_customer,
         selected_item=selected_item,
         summary=summary,
+        forecast_qty=forecast_qty,
         history=history,
         chart_file=chart_file,
         cust_name=cust_id_to_name.get(selected_customer),
@@ -84,29 +129,35 @@ def dashboard():
 
 # CHART GENERATION
 
+# One figure reused for every render; the lock keeps threaded requests apart
+_FIG, _AX = plt.subplots(figsize=(10, 4))
+_CHART_LOCK = Lock()
+
+
 def generate_chart(history, summary, cust, item):
     if history.empty:
         return None
 
-    history["YearMonth"] = pd.to_datetime(history["YearMonth"].astype(str))
+    history["YearMonth"] = history["YearMonth"].dt.to_timestamp()
     last_month = history["YearMonth"].max()
 
     forecast_val = (
         None if summary.empty else summary.iloc[0]["ForecastQty_NextMonth"]
     )
 
-    fig, ax = plt.subplots(figsize=(10, 4))
-    ax.plot(history["YearMonth"], history["TotalQty"], marker="o", label="Actual")
+    file_path = STATIC_DIR / f"{cust}_{item}.png"
 
-    if pd.notna(forecast_val):
-        ax.scatter(last_month + MonthEnd(1), forecast_val, color="red", s=120)
+    with _CHART_LOCK:
+        _AX.cla()
+        _AX.plot(history["YearMonth"], history["TotalQty"], marker="o", label="Actual")
 
-    ax.set_title("Actual Demand with Next-Month Forecast")
-    ax.grid(True)
+        if pd.notna(forecast_val):
+            _AX.scatter(last_month + MonthEnd(1), forecast_val, color="red", s=120)
 
-    file_path = STATIC_DIR / f"{cust}_{item}.png"
-    plt.savefig(file_path, bbox_inches="tight")
-    plt.close()
+        _AX.set_title("Actual Demand with Next-Month Forecast")
+        _AX.grid(True)
+
+        _FIG.savefig(file_path, bbox_inches="tight")
 
     return f"charts/{cust}_{item}.png"
 
@@ -118,15 +169,12 @@ def download():
     cust = request.args.get("customer", type=int)
     item = request.args.get("item")
 
-    df = monthly_history[
-        (monthly_history.CustId == cust) &
-        (monthly_history.ItemCode == item)
-    ]
-
-    file_path = STATIC_DIR / f"monthly_{cust}_{item}.csv"
-    df.to_csv(file_path, index=False)
-
-    return send_file(file_path, as_attachment=True)
+    return send_file(
+        BytesIO(get_history_csv(cust, item)),
+        as_attachment=True,
+        download_name=f"monthly_{cust}_{item}.csv",
+        mimetype="text/csv"
+    )
 
 if __name__ == "__main__":
     app.run(debug=True)